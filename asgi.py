@@ -0,0 +1,420 @@
+"""Yüksek eşzamanlılık için ASGI (async) sunum modu.
+
+Vardiya değişiminde yüzlerce telefonun aynı anda çağırdığı /login, /my_machines/<id>,
+/usage/start ve /usage/end istekleri async SQLAlchemy oturumuyla karşılanır. Yavaş bir istemci veya
+uzun bir veritabanı beklemesi süreci bloklamaz; bir worker binlerce bağlantıyı sınırlı sayıda
+veritabanı bağlantısıyla (DB_POOL_SIZE + DB_MAX_OVERFLOW) taşır. Havuz DB_POOL_TIMEOUT içinde
+bağlantı veremezse istek 503 alır.
+
+Modeller, önbellekler, parola havuzu, hız sınırlayıcı ve olay yayıncısı app.py'den paylaşılır.
+/events (SSE) akışı da burada async sunulur; boşta bekleyen panel bağlantıları iş parçacığı tutmaz.
+Diğer tüm yollar a2wsgi ile WSGI_FALLBACK_WORKERS iş parçacığında çalışan Flask uygulamasına
+aktarılır; yani bu modül tek başına da yayınlanabilir:
+
+    uvicorn asgi:application --host 0.0.0.0 --port $PORT --workers 2
+    gunicorn -k uvicorn.workers.UvicornWorker -w 2 asgi:application
+
+Sürücüler: PostgreSQL için asyncpg, SQLite için aiosqlite (DATABASE_URL otomatik çevrilir).
+
+Bağlantı bütçesi: her süreçte iki havuz vardır. Async havuz ASGI_DB_POOL_SIZE + ASGI_DB_MAX_OVERFLOW,
+Flask'a aktarılan yolların havuzu DB_POOL_SIZE + DB_MAX_OVERFLOW bağlantı açabilir. Veritabanına açılan
+en fazla bağlantı worker sayısı x bu iki toplamdır; max_connections buna göre planlanmalıdır
+(ör. 2 worker, ASGI 10+5, Flask 3+2 -> en fazla 40 bağlantı).
+"""
+import asyncio
+import json
+import os
+import queue
+from datetime import datetime
+
+from sqlalchemy import delete, event, insert, select, update
+from sqlalchemy.exc import IntegrityError, TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from a2wsgi import WSGIMiddleware
+
+from app import (DATABASE_URL, DB_MAX_OVERFLOW, DB_POOL_RECYCLE, DB_POOL_SIZE, DB_POOL_TIMEOUT,
+                 SSE_KEEPALIVE_SECONDS, event_broker, publish_event, publish_usage_ended,
+                 DB_STATEMENT_TIMEOUT_MS, MACHINE_PROJECTION, PASSWORD_HASH_TIMEOUT_SECONDS, ActiveSession,
+                 Machine, MachineAssignment, PasswordPoolBusy, ResourceVersion, UsageLog, User, app,
+                 authorized_machines_cache, device_user_cache, encode_json, hash_password, is_password_hash,
+                 login_retry_after, machine_cache, password_pool, password_pool_slots, serialized_cache,
+                 record_failed_login, usage_rollup_upsert, usage_rollup_values, user_cache,
+                 verify_login_password)
+
+MAX_BODY_BYTES = 1024 * 1024
+TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', '0'))
+WSGI_FALLBACK_WORKERS = int(os.environ.get('WSGI_FALLBACK_WORKERS', '10'))
+ASGI_DB_POOL_SIZE = int(os.environ.get('ASGI_DB_POOL_SIZE', str(DB_POOL_SIZE)))
+ASGI_DB_MAX_OVERFLOW = int(os.environ.get('ASGI_DB_MAX_OVERFLOW', str(DB_MAX_OVERFLOW)))
+SSE_POLL_SECONDS = 0.25
+
+def async_database_url(url):
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    if url.startswith('postgresql://') or url.startswith('postgresql+psycopg2://'):
+        return 'postgresql+asyncpg://' + url.split('://', 1)[1]
+    if url.startswith('sqlite://'):
+        return 'sqlite+aiosqlite://' + url[len('sqlite://'):]
+    return url
+
+def async_engine_options(url):
+    options = {"pool_pre_ping": True, "pool_logging_name": 'asgi'}
+    if url.startswith('sqlite') and (':memory:' in url or url.rstrip('/').endswith(':')):
+        return options
+    options.update(pool_size=ASGI_DB_POOL_SIZE, max_overflow=ASGI_DB_MAX_OVERFLOW,
+                   pool_timeout=DB_POOL_TIMEOUT, pool_recycle=DB_POOL_RECYCLE)
+    if url.startswith('postgresql') and DB_STATEMENT_TIMEOUT_MS:
+        options["connect_args"] = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+    return options
+
+ASYNC_DATABASE_URL = async_database_url(DATABASE_URL)
+engine = create_async_engine(ASYNC_DATABASE_URL, **async_engine_options(ASYNC_DATABASE_URL))
+Session = async_sessionmaker(engine, expire_on_commit=False)
+
+# aiosqlite bağlantısı sqlite3 modülünden gelmediği için app.py'deki PRAGMA dinleyicisi onu tanımaz
+@event.listens_for(engine.sync_engine, 'connect')
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    if engine.dialect.name == 'sqlite':
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+# --- Yardımcılar ---
+
+class JSONResponse:
+    def __init__(self, data=None, status=200, headers=None, body=None):
+        self.status = status
+        self.body = body if body is not None else (encode_json(data) if data is not None else b'')
+        self.headers = dict(headers or {})
+        if self.body:
+            self.headers.setdefault('content-type', 'application/json')
+
+def client_address(scope, headers):
+    # app.py'deki ProxyFix ile aynı kural: sondan TRUSTED_PROXY_COUNT'uncu X-Forwarded-For değeri
+    forwarded = headers.get('x-forwarded-for')
+    if TRUSTED_PROXY_COUNT and forwarded:
+        addresses = [address.strip() for address in forwarded.split(',')]
+        if len(addresses) >= TRUSTED_PROXY_COUNT:
+            return addresses[-TRUSTED_PROXY_COUNT]
+    return scope['client'][0] if scope.get('client') else None
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or any(tag.removeprefix('W/').strip('"') == etag for tag in tags)
+
+async def run_password_job(func, *args):
+    # app.run_password_job'ın async karşılığı: aynı havuz ve aynı kuyruk sınırı, olay döngüsü bloklanmaz
+    if not password_pool_slots.acquire(blocking=False):
+        raise PasswordPoolBusy()
+    try:
+        future = password_pool.submit(func, *args)
+    except Exception:
+        password_pool_slots.release()
+        raise
+    future.add_done_callback(lambda _: password_pool_slots.release())
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), PASSWORD_HASH_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise PasswordPoolBusy()
+
+def user_dict(row):
+    return {"id": row.id, "username": row.username, "role": row.role,
+            "device_id": row.device_id, "is_active": row.is_active}
+
+USER_COLUMNS = (User.id, User.username, User.role, User.device_id, User.is_active)
+
+# app.py'deki cached_* fonksiyonlarıyla aynı önbellekleri ve aynı kayıt biçimini kullanır
+async def cached_user(session, user_id):
+    user_data = user_cache.get(user_id)
+    if user_data is None:
+        row = (await session.execute(select(*USER_COLUMNS).where(User.id == user_id))).first()
+        if row:
+            user_data = user_dict(row)
+            user_cache.set(user_id, user_data)
+    return user_data
+
+async def cached_user_by_device(session, device_id):
+    user_data = device_user_cache.get(device_id)
+    if user_data is None:
+        row = (await session.execute(select(*USER_COLUMNS).where(User.device_id == device_id))).first()
+        if row:
+            user_data = user_dict(row)
+            device_user_cache.set(device_id, user_data)
+            user_cache.set(row.id, user_data)
+    return user_data
+
+async def cached_machine(session, machine_id):
+    machine_data = machine_cache.get(machine_id)
+    if machine_data is None:
+        rows = MACHINE_PROJECTION.to_dicts(await session.execute(MACHINE_PROJECTION.select(Machine.id == machine_id)))
+        if rows:
+            machine_data = rows[0]
+            machine_cache.set(machine_id, machine_data)
+    return machine_data
+
+async def cached_authorized_machines(session, user_id):
+    machine_ids = authorized_machines_cache.get(user_id)
+    if machine_ids is None:
+        machine_ids = frozenset((await session.execute(
+            select(MachineAssignment.machine_id).where(MachineAssignment.user_id == user_id))).scalars())
+        authorized_machines_cache.set(user_id, machine_ids)
+    return machine_ids
+
+async def usage_log_dict(session, log_id):
+    row = (await session.execute(
+        select(UsageLog.id, UsageLog.user_id, UsageLog.machine_id, UsageLog.start_time, UsageLog.end_time,
+               UsageLog.duration_minutes, User.username, Machine.name)
+        .join(User, User.id == UsageLog.user_id).join(Machine, Machine.id == UsageLog.machine_id)
+        .where(UsageLog.id == log_id))).first()
+    return {
+        "id": row.id,
+        "user_id": row.user_id,
+        "machine_id": row.machine_id,
+        "username": row.username,
+        "machine_name": row.name,
+        "start_time": row.start_time.isoformat(),
+        "end_time": row.end_time.isoformat() if row.end_time else None,
+        "duration_minutes": row.duration_minutes
+    }
+
+# --- Async endpoint'ler (app.py'deki karşılıklarıyla aynı davranış ve yanıtlar) ---
+
+async def login(session, request):
+    data = request.json
+    username = data.get('username')
+    password = data.get('password')
+    device_id = data.get('device_id')
+
+    retry_after = login_retry_after(request.client, device_id)
+    if retry_after is not None:
+        return JSONResponse({"message": "Çok fazla giriş denemesi, lütfen daha sonra tekrar deneyin"}, 429,
+                            {'retry-after': str(retry_after)})
+
+    user = None
+    if username and password:
+        row = (await session.execute(select(*USER_COLUMNS, User.password).where(User.username == username))).first()
+        try:
+            if await run_password_job(verify_login_password, row.password if row else None, password):
+                if not is_password_hash(row.password):
+                    # Düz metin kayıt ilk başarılı girişte hash'e dönüştürülür
+                    new_hash = await run_password_job(hash_password, password)
+                    await session.execute(update(User).where(User.id == row.id).values(password=new_hash))
+                    await session.commit()
+                user = user_dict(row)
+        except PasswordPoolBusy:
+            return JSONResponse({"message": "Sunucu meşgul, lütfen tekrar deneyin"}, 503)
+    elif device_id:
+        user = await cached_user_by_device(session, device_id)
+
+    if user and user["is_active"]:
+        return JSONResponse({"message": "Giriş başarılı", "user": user, "role": user["role"]})
+    record_failed_login(request.client)
+    return JSONResponse({"message": "Geçersiz kimlik bilgileri veya yetkisiz cihaz"}, 401)
+
+async def my_machines(session, request, user_id):
+    user = await cached_user(session, user_id)
+    if not user or not user["is_active"]:
+        return JSONResponse({"message": "Kullanıcı bulunamadı"}, 404)
+
+    versions = dict((await session.execute(select(ResourceVersion.name, ResourceVersion.version))).all())
+    etag = f"my-machines-{user_id}-{versions.get('users', 0)}-{versions.get('machines', 0)}-{versions.get('assignments', 0)}"
+    headers = {'etag': f'"{etag}"', 'cache-control': 'no-cache'}
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return JSONResponse(status=304, headers=headers)
+
+    # WSGI tarafıyla aynı anahtar: iki mod aynı süreçte çalışırsa serileştirilmiş gövdeyi paylaşır
+    body = serialized_cache.get(etag)
+    if body is None:
+        query = MACHINE_PROJECTION.select(Machine.is_active == True)
+        if user["role"] == 'technician':
+            query = query.join(MachineAssignment, MachineAssignment.machine_id == Machine.id) \
+                .where(MachineAssignment.user_id == user_id)
+        elif user["role"] not in ('admin', 'manager'):
+            query = None
+        body = encode_json(MACHINE_PROJECTION.to_dicts(await session.execute(query)) if query is not None else [])
+        serialized_cache.set(etag, body)
+    return JSONResponse(body=body, headers=headers)
+
+async def start_usage(session, request):
+    data = request.json
+    user_id = data.get('user_id')
+    machine_id = data.get('machine_id')
+
+    if user_id is None or machine_id is None:
+        return JSONResponse({"message": "Kullanıcı ID veya Makine ID eksik"}, 400)
+    try:
+        user_id, machine_id = int(user_id), int(machine_id)
+    except (TypeError, ValueError):
+        return JSONResponse({"message": "Kullanıcı ID veya Makine ID geçersiz"}, 400)
+
+    user = await cached_user(session, user_id)
+    machine = await cached_machine(session, machine_id)
+    if not user or not machine:
+        return JSONResponse({"message": "Kullanıcı veya makine bulunamadı"}, 404)
+    if not user["is_active"] or not machine["is_active"]:
+        return JSONResponse({"message": "Kullanıcı veya makine devre dışı"}, 403)
+    if user["role"] == 'technician':
+        if machine["id"] not in await cached_authorized_machines(session, user["id"]):
+            return JSONResponse({"message": "Bu makineyi kullanmaya yetkiniz yok"}, 403)
+
+    start_time = datetime.utcnow()
+    try:
+        log_id = (await session.execute(
+            insert(UsageLog).values(user_id=user["id"], machine_id=machine["id"], start_time=start_time)
+            .returning(UsageLog.id))).scalar_one()
+        # Makinede açık oturum varsa birincil anahtar çakışır
+        await session.execute(insert(ActiveSession).values(
+            machine_id=machine["id"], log_id=log_id, user_id=user["id"], started_at=start_time, last_seen=start_time))
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        return JSONResponse({"message": "Makine şu anda başka bir oturumda kullanımda"}, 409)
+    publish_event('usage_started', log_id=log_id, user_id=user["id"],
+                  machine_id=machine["id"], start_time=start_time.isoformat())
+    return JSONResponse({"message": "Kullanım başlatıldı", "log_id": log_id})
+
+async def end_usage(session, request):
+    log_id = request.json.get('log_id')
+    end_time = datetime.utcnow()
+
+    log = (await session.execute(select(UsageLog).where(UsageLog.id == log_id))).scalar_one_or_none()
+    if not log:
+        return JSONResponse({"message": "Kullanım kaydı bulunamadı"}, 404)
+    if log.end_time:
+        return JSONResponse({"message": "Kullanım zaten sonlandırılmış", "log": await usage_log_dict(session, log.id)})
+
+    log.end_time = end_time
+    log.duration_minutes = int((end_time - log.start_time).total_seconds() / 60)
+    await session.flush()
+    await session.execute(usage_rollup_upsert(usage_rollup_values([log]), engine.dialect.name))
+    await session.execute(delete(ActiveSession).where(ActiveSession.log_id == log.id))
+    await session.commit()
+    publish_usage_ended(log)
+    return JSONResponse({"message": "Kullanım sonlandırıldı", "log": await usage_log_dict(session, log.id)})
+
+ROUTES = {
+    ('POST', '/login'): login,
+    ('POST', '/usage/start'): start_usage,
+    ('POST', '/usage/end'): end_usage,
+}
+
+def resolve(method, path):
+    if (method, path) in ROUTES:
+        return ROUTES[(method, path)], ()
+    if method == 'GET' and path.startswith('/my_machines/') and path[len('/my_machines/'):].isdigit():
+        return my_machines, (int(path[len('/my_machines/'):]),)
+    return None, ()
+
+# --- ASGI uygulaması ---
+
+class Request:
+    def __init__(self, scope, headers, json_body):
+        self.headers = headers
+        self.json = json_body
+        self.client = client_address(scope, headers)
+
+async def read_body(receive):
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunks.append(message.get('body', b''))
+        size += len(chunks[-1])
+        if size > MAX_BODY_BYTES:
+            return None
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+async def send_response(send, response):
+    # flask-cors varsayılanı gibi tüm kökenlere izin verilir
+    headers = dict(response.headers, **{'access-control-allow-origin': '*',
+                                        'access-control-expose-headers': 'ETag, X-Resource-Version'})
+    headers['content-length'] = str(len(response.body))
+    await send({'type': 'http.response.start', 'status': response.status,
+                'headers': [(key.encode(), value.encode()) for key, value in headers.items()]})
+    await send({'type': 'http.response.body', 'body': response.body})
+
+async def handle(scope, receive, send, handler, args):
+    headers = {key.decode('latin-1'): value.decode('latin-1') for key, value in scope['headers']}
+    json_body = None
+    if scope['method'] == 'POST':
+        body = await read_body(receive)
+        try:
+            json_body = json.loads(body) if body else None
+        except ValueError:
+            json_body = None
+        if not isinstance(json_body, dict):
+            return await send_response(send, JSONResponse({"message": "Geçersiz JSON gövdesi"}, 400))
+
+    try:
+        async with Session() as session:
+            response = await handler(session, Request(scope, headers, json_body), *args)
+    except PoolTimeoutError:
+        # Bağlantı havuzu dolu: istekleri sınırsız biriktirmek yerine istemciye tekrar denemesini söyle
+        response = JSONResponse({"message": "Sunucu meşgul, lütfen tekrar deneyin"}, 503, {'retry-after': '1'})
+    await send_response(send, response)
+
+async def stream_events(scope, receive, send):
+    # app.py'deki /events ile aynı akış. Abone kuyruğu iş parçacığı kuyruğu olduğundan beklemek yerine
+    # kısa aralıklarla yoklanır; böylece açık panel bağlantıları iş parçacığı havuzunu tüketmez.
+    subscriber = event_broker.subscribe()
+    if subscriber is None:
+        return await send_response(send, JSONResponse(
+            {"message": "Çok fazla canlı bağlantı var, lütfen daha sonra tekrar deneyin"}, 503))
+
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        disconnected.set()
+
+    watcher = asyncio.create_task(watch_disconnect())
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'), (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'), (b'access-control-allow-origin', b'*')]})
+        message, idle = ": bağlandı\n\n", 0.0
+        while not subscriber.dropped and not disconnected.is_set():
+            if message:
+                await send({'type': 'http.response.body', 'body': message.encode(), 'more_body': True})
+                message, idle = None, 0.0
+            try:
+                message = subscriber.queue.get_nowait()
+            except queue.Empty:
+                if idle >= SSE_KEEPALIVE_SECONDS:
+                    message = ": keepalive\n\n" # Proxy'ler boşta bağlantıyı kapatmasın
+                else:
+                    await asyncio.sleep(SSE_POLL_SECONDS)
+                    idle += SSE_POLL_SECONDS
+        if not disconnected.is_set():
+            await send({'type': 'http.response.body', 'body': b''})
+    except OSError:
+        pass # İstemci bağlantısı koptu
+    finally:
+        watcher.cancel()
+        event_broker.unsubscribe(subscriber)
+
+wsgi_fallback = WSGIMiddleware(app, workers=WSGI_FALLBACK_WORKERS)
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] == 'http':
+        handler, args = resolve(scope['method'], scope['path'])
+        if handler:
+            return await handle(scope, receive, send, handler, args)
+        if scope['method'] == 'GET' and scope['path'] == '/events':
+            return await stream_events(scope, receive, send)
+        # Diğer tüm yollar (admin paneli, raporlar) senkron Flask uygulamasına gider
+        return await wsgi_fallback(scope, receive, send)
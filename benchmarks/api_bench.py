@@ -0,0 +1,318 @@
+"""API sıcak yolları için tekrarlanabilir yük testi (Flask test client ve gunicorn).
+
+Geçici bir SQLite veritabanı `seed_benchmark_data` ile sabit tohumla doldurulur, ardından
+/login (cihaz), /my_machines, /usage/start + /usage/end, /usage_logs ve /assignments
+senaryoları çok iş parçacıklı olarak çalıştırılır. Her senaryo için p50/p99 gecikme,
+saniyedeki istek sayısı ve tepe RSS raporlanır.
+
+    python benchmarks/api_bench.py --save-baseline            # referans ölçümü kaydet
+    python benchmarks/api_bench.py                            # referansla karşılaştır
+    python benchmarks/api_bench.py --mode gunicorn --workers 4
+    python benchmarks/api_bench.py --users 5000 --machines 2000 --logs 2000000 --db /tmp/bench.db
+
+Referans dosyası makineye özgüdür; aynı donanımda ve aynı veri boyutlarıyla karşılaştırın.
+p99 gecikme toleranstan fazla artarsa veya verim toleranstan fazla düşerse çıkış kodu 1 olur.
+Bir senaryoda 4xx/5xx yanıt oranı --max-error-rate'i aşarsa ölçüm geçersiz sayılır (hızlanma
+gibi görünen hatalar referansa yazılmaz) ve çıkış kodu yine 1 olur.
+"""
+import argparse
+import http.client
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+SCENARIOS = ['login_device', 'my_machines', 'usage_cycle', 'usage_logs', 'assignments']
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def configure_environment(db_path):
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    # Ölçüm tek IP'den geldiği için hız sınırı kapatılır, arka plan temizleyicisi sonuçları bozmasın
+    os.environ.setdefault('LOGIN_RATE_CAPACITY', '1000000000')
+    os.environ.setdefault('LOGIN_RATE_PER_MINUTE', '1000000000')
+    os.environ.setdefault('LOGIN_DEVICE_RATE_CAPACITY', '1000000000')
+    os.environ.setdefault('LOGIN_DEVICE_RATE_PER_MINUTE', '1000000000')
+    os.environ.setdefault('SESSION_REAPER_INTERVAL_SECONDS', '0')
+    sys.path.insert(0, ROOT)
+
+
+def load_fixtures(args):
+    from app import app, db, seed_benchmark_data, User, MachineAssignment
+
+    with app.app_context():
+        if not args.reuse or not os.path.exists(args.db_path) or not db.inspect(db.engine).has_table('user'):
+            started = time.perf_counter()
+            seed_benchmark_data(args.users, args.machines, args.logs)
+            print(f"Veri üretildi ({time.perf_counter() - started:.1f} sn)", file=sys.stderr)
+        technicians = db.session.execute(
+            db.select(User.id, User.device_id).where(User.role == 'technician').order_by(User.id)).all()
+        # Eşzamanlı başlat/bitir istekleri aynı makineye çakışmasın diye her makine tek kullanıcıyla eşlenir
+        pairs = {}
+        for user_id, machine_id in db.session.execute(
+                db.select(MachineAssignment.user_id, MachineAssignment.machine_id).order_by(MachineAssignment.id)):
+            pairs.setdefault(machine_id, user_id)
+    return technicians, [(user_id, machine_id) for machine_id, user_id in sorted(pairs.items())]
+
+
+class TestClientTransport:
+    def __init__(self):
+        from app import app
+        self.app = app
+        self.local = threading.local()
+
+    def request(self, method, path, payload=None):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        response = client.open(path, method=method, json=payload)
+        return response.status_code, response.get_json(silent=True)
+
+    def peak_rss_kb(self):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class HTTPTransport:
+    def __init__(self, port, master_pid):
+        self.port = port
+        self.master_pid = master_pid
+
+    def request(self, method, path, payload=None):
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        try:
+            body = json.dumps(payload) if payload is not None else None
+            headers = {'Content-Type': 'application/json'} if body else {}
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            data = response.read()
+        finally:
+            connection.close()
+        try:
+            return response.status, json.loads(data)
+        except ValueError:
+            return response.status, None
+
+    def peak_rss_kb(self):
+        # Ana süreç ve tüm işçilerin VmHWM değerlerinin toplamı
+        pids = [self.master_pid] + child_pids(self.master_pid)
+        return sum(read_vmhwm(pid) for pid in pids)
+
+
+def child_pids(parent_pid):
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as stat:
+                fields = stat.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == parent_pid:
+            children.append(int(entry))
+    return children
+
+
+def read_vmhwm(pid):
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(workers, threads):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--threads', str(threads),
+         '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', 'app:app'],
+        cwd=ROOT, env=os.environ.copy())
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"gunicorn başlatılamadı (çıkış kodu {process.returncode})")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return process, port
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit("gunicorn 30 saniye içinde dinlemeye başlamadı")
+
+
+def scenario_calls(name, technicians, pairs):
+    if name == 'login_device':
+        return lambda transport, i: [transport.request(
+            'POST', '/login', {"device_id": technicians[i % len(technicians)][1]})]
+    if name == 'my_machines':
+        return lambda transport, i: [transport.request(
+            'GET', f'/my_machines/{technicians[i % len(technicians)][0]}')]
+    if name == 'usage_cycle':
+        def cycle(transport, i):
+            user_id, machine_id = pairs[i % len(pairs)]
+            status, body = transport.request('POST', '/usage/start', {"user_id": user_id, "machine_id": machine_id})
+            results = [(status, body)]
+            if status == 200:
+                results.append(transport.request('POST', '/usage/end', {"log_id": body["log_id"]}))
+            return results
+        return cycle
+    if name == 'usage_logs':
+        return lambda transport, i: [transport.request('GET', '/usage_logs?limit=100')]
+    if name == 'assignments':
+        return lambda transport, i: [transport.request('GET', '/assignments')]
+    raise ValueError(name)
+
+
+def run_scenario(transport, call, requests, concurrency):
+    def timed(i):
+        started = time.perf_counter()
+        results = call(transport, i)
+        return [status for status, _ in results], time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, range(min(requests, concurrency * 4))))  # ısınma: önbellekler ve bağlantılar
+        started = time.perf_counter()
+        results = list(pool.map(timed, range(requests)))
+        elapsed = time.perf_counter() - started
+
+    latencies = [latency for _, latency in results]
+    statuses = {}
+    for codes, _ in results:
+        for status in codes:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(count for status, count in statuses.items() if int(status) >= 400)
+    return {
+        "requests": requests,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "statuses": statuses,
+        "error_rate": round(errors / sum(statuses.values()), 4),
+    }
+
+
+def run_mode(mode, args, technicians, pairs):
+    process = None
+    if mode == 'client':
+        transport = TestClientTransport()
+    else:
+        process, port = start_gunicorn(args.workers, args.threads)
+        transport = HTTPTransport(port, process.pid)
+    try:
+        results = {}
+        for name in args.scenarios:
+            results[name] = run_scenario(transport, scenario_calls(name, technicians, pairs),
+                                         args.requests, args.concurrency)
+            print(f"{mode}/{name}: {results[name]['requests_per_second']} istek/sn, "
+                  f"p99 {results[name]['p99_ms']} ms, hata oranı {results[name]['error_rate']:.2%}", file=sys.stderr)
+        return {"scenarios": results, "peak_rss_kb": transport.peak_rss_kb()}
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=30)
+
+
+def failed_scenarios(report, max_error_rate):
+    return [f"{mode}/{name}: hata oranı {result['error_rate']:.2%} ({result['statuses']})"
+            for mode, current in report["modes"].items()
+            for name, result in current["scenarios"].items() if result["error_rate"] > max_error_rate]
+
+def compare(report, baseline, tolerance):
+    regressions = []
+    for mode, current in report["modes"].items():
+        previous = baseline.get("modes", {}).get(mode)
+        if not previous:
+            continue
+        for name, result in current["scenarios"].items():
+            before = previous["scenarios"].get(name)
+            if not before:
+                continue
+            if result["p99_ms"] > before["p99_ms"] * (1 + tolerance):
+                regressions.append(f"{mode}/{name}: p99 {before['p99_ms']} -> {result['p99_ms']} ms")
+            if result["requests_per_second"] < before["requests_per_second"] * (1 - tolerance):
+                regressions.append(f"{mode}/{name}: verim {before['requests_per_second']} -> "
+                                   f"{result['requests_per_second']} istek/sn")
+        if current["peak_rss_kb"] > previous["peak_rss_kb"] * (1 + tolerance):
+            regressions.append(f"{mode}: tepe RSS {previous['peak_rss_kb']} -> {current['peak_rss_kb']} KB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--machines', type=int, default=1000)
+    parser.add_argument('--logs', type=int, default=1000000)
+    parser.add_argument('--requests', type=int, default=2000, help='senaryo başına istek sayısı')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--mode', choices=['client', 'gunicorn', 'both'], default='client')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument('--db', dest='db_path', help='veritabanı dosyası (varsayılan: geçici dizin)')
+    parser.add_argument('--reuse', action='store_true', help='--db zaten doluysa yeniden üretme')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='izin verilen göreli kötüleşme')
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help='izin verilen 4xx/5xx yanıt oranı')
+    args = parser.parse_args()
+
+    args.db_path = os.path.abspath(args.db_path or os.path.join(tempfile.mkdtemp(), 'api_bench.db'))
+    configure_environment(args.db_path)
+    technicians, pairs = load_fixtures(args)
+
+    modes = ['client', 'gunicorn'] if args.mode == 'both' else [args.mode]
+    report = {
+        "dataset": {"users": args.users, "machines": args.machines, "logs": args.logs},
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "workers": args.workers,
+        "modes": {mode: run_mode(mode, args, technicians, pairs) for mode in modes},
+    }
+    print(json.dumps(report, indent=2))
+
+    failures = failed_scenarios(report, args.max_error_rate)
+    for line in failures:
+        print(f"HATALI {line}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(report, baseline_file, indent=2)
+        print(f"Referans kaydedildi: {args.baseline}", file=sys.stderr)
+        return
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get("dataset") != report["dataset"]:
+            print("Uyarı: referans farklı veri boyutlarıyla alınmış", file=sys.stderr)
+        regressions = compare(report, baseline, args.tolerance)
+        for line in regressions:
+            print(f"GERİLEME {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
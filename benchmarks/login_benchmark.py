@@ -0,0 +1,81 @@
+"""/login verimlilik ölçümü (Flask test client, çok iş parçacıklı).
+
+Önce/sonra karşılaştırması için aynı betik iki revizyonda çalıştırılır. Betik eski commit'te
+bulunmadığından önce ağaç dışına kopyalanır, temel commit'e geçilip oradan çalıştırılır:
+
+    cp benchmarks/login_benchmark.py /tmp/
+    git checkout <temel-commit> && python /tmp/login_benchmark.py --root .
+    git checkout - && python benchmarks/login_benchmark.py
+
+Kullanıcılar düz metin parolayla eklenir; ısınma turunda her kullanıcı bir kez giriş
+yapar (yeni sürümde bu tur parolaları hash'e dönüştürür), ölçüm turu sonra başlar.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--root', default=ROOT, help="app.py'nin bulunduğu dizin")
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'login_benchmark.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    # Ölçüm tek IP'den geldiği için hız sınırı devre dışı bırakılır
+    os.environ.setdefault('LOGIN_RATE_CAPACITY', '1000000000')
+    os.environ.setdefault('LOGIN_RATE_PER_MINUTE', '1000000000')
+    sys.path.insert(0, os.path.abspath(args.root))
+    from app import app, db, User
+
+    with app.app_context():
+        db.create_all()
+        db.session.execute(db.insert(User), [
+            {"username": f"bench{i}", "password": f"pass{i}", "role": "technician"}
+            for i in range(args.users)])
+        db.session.commit()
+
+    def login(i):
+        client = app.test_client()
+        started = time.perf_counter()
+        response = client.post('/login', json={"username": f"bench{i % args.users}", "password": f"pass{i % args.users}"})
+        return response.status_code, time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(login, range(args.users)))  # ısınma ve parola dönüşümü
+
+        started = time.perf_counter()
+        results = list(pool.map(login, range(args.requests)))
+        elapsed = time.perf_counter() - started
+
+    latencies = [latency for _, latency in results]
+    statuses = {}
+    for status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    print(json.dumps({
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(args.requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "statuses": statuses,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+import itertools
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+# app ortam değişkenlerini import sırasında okur; geçici SQLite birincil ve okuma kopyası kullanılır
+DATA_DIR = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(DATA_DIR, 'primary.db')}"
+os.environ['READ_REPLICA_URL'] = f"sqlite:///{os.path.join(DATA_DIR, 'replica.db')}"
+os.environ['QUERY_COUNT_HEADER'] = '1'
+os.environ['SESSION_REAPER_INTERVAL_SECONDS'] = '0'
+os.environ['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+from sqlalchemy.orm import Session
+from app import (Machine, MachineAssignment, UsageLog, User, app, db, full_scans_in_plan,
+                 hash_password, hot_path_queries, request_metrics)
+
+
+FIXTURE_MACS = (f'02:00:00:00:01:{i:02X}' for i in itertools.count(1))
+
+
+def add_fixtures(session, username, log_count):
+    user = User(username=username, password=hash_password('parola'), role='technician', device_id=f'{username}-cihaz')
+    machine = Machine(name=f'{username}-makine', bluetooth_mac=next(FIXTURE_MACS))
+    session.add_all([user, machine])
+    session.flush()
+    session.add(MachineAssignment(user_id=user.id, machine_id=machine.id))
+    started = datetime.utcnow() - timedelta(days=1)
+    session.add_all(UsageLog(user_id=user.id, machine_id=machine.id, start_time=started + timedelta(minutes=i),
+                             end_time=started + timedelta(minutes=i + 5), duration_minutes=5)
+                    for i in range(log_count))
+    session.commit()
+    return user.id
+
+
+@pytest.fixture(scope='module')
+def client():
+    with app.app_context():
+        db.create_all()
+        db.metadata.create_all(db.engines['replica'])
+        add_fixtures(db.session, 'birincil', 3)
+        with Session(db.engines['replica']) as replica:
+            add_fixtures(replica, 'kopya', 2)
+    return app.test_client()
+
+
+def test_hot_path_queries_use_indexes(client):
+    with app.app_context():
+        for name, statement, allow_ordered_scan in hot_path_queries():
+            assert full_scans_in_plan(statement, allow_ordered_scan) == [], name
+
+
+def test_replica_route_reads_from_replica(client):
+    logs = client.get('/usage_logs').get_json()
+    assert {log['username'] for log in logs} == {'kopya'}
+    assert len(logs) == 2
+
+
+def test_write_routes_use_primary(client):
+    users = client.get('/users').get_json()
+    assert 'birincil' in {user['username'] for user in users}
+    assert 'kopya' not in {user['username'] for user in users}
+
+
+def test_query_count_header_does_not_grow_with_rows(client):
+    before = int(client.get('/usage_logs?user_id=1').headers['X-Query-Count'])
+    with app.app_context():
+        with Session(db.engines['replica']) as replica:
+            started = datetime.utcnow()
+            replica.add_all(UsageLog(user_id=1, machine_id=1, start_time=started + timedelta(minutes=i))
+                            for i in range(20))
+            replica.commit()
+    response = client.get('/usage_logs?user_id=1')
+    assert len(response.get_json()) == 22
+    assert int(response.headers['X-Query-Count']) == before
+
+
+def test_query_budget_counts_requests_over_budget(client, monkeypatch):
+    key = ('/analytics/usage', 'GET')
+    query_count = int(client.get('/analytics/usage').headers['X-Query-Count'])
+    assert query_count > 1
+    before = request_metrics.over_budget[key]
+
+    monkeypatch.setattr(app_module, 'QUERY_BUDGET', query_count)
+    client.get('/analytics/usage')
+    assert request_metrics.over_budget[key] == before
+
+    monkeypatch.setattr(app_module, 'QUERY_BUDGET', query_count - 1)
+    client.get('/analytics/usage')
+    assert request_metrics.over_budget[key] == before + 1
+
+
+def test_import_machines_csv_with_bom_normalises_and_dedupes_macs(client):
+    body = ('\ufeffname,bluetooth_mac,friendly_name\n'
+            'ithal-1,aa-bb-cc-dd-ee-01,I-1\n'
+            'ithal-2,AABB.CCDD.EE01,I-2\n'
+            'ithal-3,xyz,I-3\n')
+    report = client.post('/machines/import', data=body, content_type='text/csv').get_json()
+    assert report['created'] == 1
+    assert [error['row'] for error in report['errors']] == [2, 3]
+    with app.app_context():
+        assert db.session.execute(db.select(Machine.bluetooth_mac).where(Machine.name == 'ithal-1')).scalar() == \
+            'AA:BB:CC:DD:EE:01'
+
+    again = client.post('/machines/import', json=[{"name": "ithal-4", "bluetooth_mac": "aa:bb:cc:dd:ee:01"},
+                                                  {"name": 5, "bluetooth_mac": "02:00:00:00:00:99"}]).get_json()
+    assert again['created'] == 0
+    assert again['errors'] == [{"row": 1, "message": "Bu MAC adresine sahip makine zaten mevcut"},
+                               {"row": 2, "message": "name alanı metin olmalıdır"}]
+
+
+def test_import_users_reports_invalid_rows(client):
+    rows = [
+        {"username": "ithal-a", "password": "parola", "role": "technician", "device_id": "ithal-a-cihaz"},
+        {"username": "ithal-a", "password": "parola", "role": "technician"},
+        {"username": "birincil", "password": "parola", "role": "technician"},
+        {"username": "ithal-b", "password": 1234, "role": "technician"},
+        {"username": "ithal-c", "password_hash": "scrypt:32768:8:1$" + "x" * 140, "role": "technician"},
+        {"username": "ithal-d", "password_hash": hash_password('parola'), "role": "manager"},
+        {"username": "ithal-e", "password": "parola", "role": "kral"},
+    ]
+    report = client.post('/users/import', json=rows).get_json()
+    assert report['created'] == 2
+    assert {error['row']: error['message'] for error in report['errors']} == {
+        2: "Kullanıcı adı dosyada tekrar ediyor",
+        3: "Kullanıcı adı zaten mevcut",
+        4: "password alanı metin olmalıdır",
+        5: "password_hash alanı pbkdf2 hash'i olmalıdır",
+        7: "Geçersiz rol: kral",
+    }
+
+
+def test_import_users_caps_plaintext_passwords_over_http(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'IMPORT_MAX_PLAINTEXT_PASSWORDS', 2)
+    rows = [{"username": f"sinir-{i}", "password": "parola", "role": "technician"} for i in range(3)]
+    response = client.post('/users/import', json=rows)
+    assert response.status_code == 400
+    with app.app_context():
+        assert not db.session.execute(db.select(User.id).where(User.username.like('sinir-%'))).first()
+
+
+def test_import_assignment_matrix_skips_existing_pairs(client):
+    client.post('/users/import', json=[{"username": f"matris-{i}", "password": "parola", "role": "technician"}
+                                       for i in range(2)])
+    client.post('/machines/import', json=[{"name": "matris-m", "bluetooth_mac": "02:00:00:00:0a:01"}])
+    matrix = {"users": ["matris-0", "matris-1"], "machines": ["02-00-00-00-0A-01", "yok"]}
+    report = client.post('/assignments/import', json=matrix).get_json()
+    assert report['created'] == 2
+    assert [error['row'] for error in report['errors']] == [2, 4]
+
+    again = client.post('/assignments/import', json=matrix).get_json()
+    assert again['created'] == 0
+    assert again['skipped'] == 2
+
+
+def test_usage_log_date_filters_convert_offsets_to_utc(client):
+    with app.app_context():
+        with Session(db.engines['replica']) as replica:
+            replica.add(UsageLog(user_id=1, machine_id=1, start_time=datetime(2026, 1, 1, 11, 0)))
+            replica.commit()
+    for date_from in ('2026-01-01T12:00:00+02:00', '2026-01-01T10:00:00Z', '2026-01-01T10:00:00'):
+        logs = client.get('/usage_logs', query_string={
+            'user_id': 1, 'from': date_from, 'to': '2026-01-01T14:00:00+02:00'}).get_json()
+        assert [log['start_time'] for log in logs] == ['2026-01-01T11:00:00'], date_from
+
+
+def sync_fixture(username):
+    with app.app_context():
+        user_id = add_fixtures(db.session, username, 0)
+        machine_id = db.session.execute(
+            db.select(MachineAssignment.machine_id).where(MachineAssignment.user_id == user_id)).scalar()
+    return user_id, machine_id
+
+
+def test_sync_start_and_end_in_one_batch_is_idempotent_on_replay(client):
+    user_id, machine_id = sync_fixture('senkron')
+    batch = {"user_id": user_id, "events": [
+        {"key": "senkron-1", "type": "start", "machine_id": machine_id, "timestamp": "2026-02-01T08:00:00Z"},
+        {"key": "senkron-2", "type": "end", "start_key": "senkron-1", "timestamp": "2026-02-01T08:30:00Z"},
+    ]}
+    results = client.post('/usage/sync', json=batch).get_json()['results']
+    assert [result['status'] for result in results] == ['started', 'ended']
+    log_id = results[0]['log_id']
+    assert results[1]['log_id'] == log_id
+    assert results[1]['duration_minutes'] == 30
+
+    replay = client.post('/usage/sync', json=batch).get_json()['results']
+    assert [(result['status'], result['log_id']) for result in replay] == [('duplicate', log_id), ('duplicate', log_id)]
+    with app.app_context():
+        logs = db.session.execute(db.select(UsageLog.end_time).where(UsageLog.user_id == user_id)).scalars().all()
+        assert logs == [datetime(2026, 2, 1, 8, 30)]
+        assert not db.session.get(app_module.ActiveSession, machine_id)
+
+
+def test_sync_rejects_boolean_ids(client):
+    user_id, machine_id = sync_fixture('senkron-bool')
+    events = [{"key": "bool-1", "type": "start", "machine_id": True, "timestamp": "2026-02-01T08:00:00Z"},
+              {"key": "bool-2", "type": "start", "machine_id": machine_id, "user_id": True,
+               "timestamp": "2026-02-01T08:00:00Z"},
+              {"key": "bool-3", "type": "end", "log_id": True, "timestamp": "2026-02-01T08:00:00Z"}]
+    results = client.post('/usage/sync', json={"user_id": user_id, "events": events}).get_json()['results']
+    assert [result['message'] for result in results] == [
+        "Makine ID eksik", "Kullanıcı ID eksik", "log_id veya start_key zorunludur"]
+
+
+def test_bump_version_creates_and_increments_counter(client):
+    with app.app_context():
+        assert app_module.bump_version('test-sayac') == 1
+        assert app_module.bump_version('test-sayac') == 2
+        db.session.commit()
+        assert app_module.current_versions()['test-sayac'] == 2
+
+
+@pytest.mark.parametrize('kind', ['users', 'machines'])
+def test_deactivating_owner_closes_open_session(client, kind):
+    user_id, machine_id = sync_fixture(f'devre-disi-{kind}')
+    log_id = client.post('/usage/start', json={"user_id": user_id, "machine_id": machine_id}).get_json()['log_id']
+    assert machine_id in {session['machine_id'] for session in client.get('/machines/active').get_json()}
+
+    client.delete(f"/{kind}/{user_id if kind == 'users' else machine_id}")
+    assert machine_id not in {session['machine_id'] for session in client.get('/machines/active').get_json()}
+    with app.app_context():
+        log = db.session.get(UsageLog, log_id)
+        assert log.end_time is not None and log.duration_minutes == 0
+        assert db.session.execute(db.select(app_module.UsageDailyRollup.session_count)
+                                  .where(app_module.UsageDailyRollup.user_id == user_id)).scalar() == 1